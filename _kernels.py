@@ -0,0 +1,126 @@
+import math
+import numpy as np
+
+# Numba is optional: without it the particle filter falls back to its vectorized NumPy implementation.
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+    prange = range
+
+
+@njit(inline='always', fastmath=True)
+def fast_atan2(y, x):
+    """
+    Polynomial approximation of 'math.atan2' (absolute error below 1e-5 rad),
+    which is accurate enough for the angle likelihood, whose standard deviation is in the order of 0.1 rad.
+
+    :param y: y-coordinate.
+    :param x: x-coordinate.
+    :return:  Angle (rad) within [-pi, pi].
+    """
+
+    abs_x = abs(x)
+    abs_y = abs(y)
+    if abs_x == 0.0 and abs_y == 0.0:
+        return 0.0
+
+    # Reduce to the first octant, where the ratio lies within [0, 1].
+    a = min(abs_x, abs_y) / max(abs_x, abs_y)
+    s = a * a
+    r = a * (0.99997726 + s * (-0.33262347 + s * (0.19354346 + s * (-0.11643287 + s * (0.05265332 + s * -0.01172120)))))
+
+    # Map back to the original octant.
+    if abs_y > abs_x:
+        r = 0.5 * math.pi - r
+    if x < 0.0:
+        r = math.pi - r
+    if y < 0.0:
+        r = -r
+    return r
+
+
+@njit(inline='always', fastmath=True)
+def propagate_particle(x, y, th, i, d, r, Q0, Q1, Q2, xmax, ymax, noise):
+    """
+    Propagate the state of particle 'i' in place (parameters as in 'propagate_all').
+    """
+
+    heading = th[i]
+    x[i] = (x[i] + d * math.cos(heading) + Q0 * noise[0, i]) % xmax
+    y[i] = (y[i] + d * math.sin(heading) + Q1 * noise[1, i]) % ymax
+    th[i] = (heading + r + Q2 * noise[2, i]) % (2 * math.pi)
+
+
+@njit(inline='always', fastmath=True)
+def particle_log_likelihood(xi, yi, meas, lm, inv2d, inv2a):
+    """
+    Compute the log-likelihood of a single particle position (parameters as in 'likelihood_all').
+
+    :param xi, yi: x-position and y-position of the particle.
+    :return:       Log-likelihood of the particle.
+    """
+
+    acc = 0.0
+    for j in range(lm.shape[0]):
+        dx = xi - lm[j, 0]
+        dy = yi - lm[j, 1]
+        delta_distance = meas[j, 0] - math.sqrt(dx * dx + dy * dy)
+        delta_angle = meas[j, 1] - fast_atan2(dy, dx)
+        acc -= delta_distance * delta_distance * inv2d + delta_angle * delta_angle * inv2a
+    return acc
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def propagate_all(x, y, th, d, r, Q0, Q1, Q2, xmax, ymax, noise):
+    """
+    Propagate all particle states in place (see 'ParticleFilter.propagate_all').
+
+    :param x, y, th:   Arrays with the x-positions, y-positions and heading angles of the particles.
+    :param d:          Desired forward motion distance (m).
+    :param r:          Desired rotation angle (rad).
+    :param Q0, Q1, Q2: Standard deviations of the additive noise on [x (m), y (m), heading angle (rad)].
+    :param xmax, ymax: World dimensions of the cyclic world (m).
+    :param noise:      Array of shape (3, number of particles) with standard normal samples.
+    """
+
+    for i in prange(x.shape[0]):
+        propagate_particle(x, y, th, i, d, r, Q0, Q1, Q2, xmax, ymax, noise)
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def likelihood_all(x, y, meas, lm, inv2d, inv2a):
+    """
+    Compute the log-likelihood of all particle states (see 'ParticleFilter.compute_log_likelihood_all').
+
+    :param x, y:         Arrays with the x-positions and y-positions of the particles.
+    :param meas:         Array of shape (number of landmarks, 2) with the measured [distance, angle] to each landmark.
+    :param lm:           Array of shape (number of landmarks, 2) with the landmark positions.
+    :param inv2d, inv2a: Constant factors 1/(2*sigma^2) of the distance and angle likelihood.
+    :return:             Array with the log-likelihood of each particle.
+    """
+
+    log_likelihood = np.empty(x.shape[0])
+    for i in prange(x.shape[0]):
+        log_likelihood[i] = particle_log_likelihood(x[i], y[i], meas, lm, inv2d, inv2a)
+    return log_likelihood
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def sir_step(x, y, th, logw, d, r, Q0, Q1, Q2, meas, lm, inv2d, inv2a, xmax, ymax, noise):
+    """
+    Propagate all particle states and accumulate their log-likelihoods into 'logw' in a single pass,
+    without materializing any (number of particles, number of landmarks) intermediate arrays
+    (see 'ParticleFilter.predict_and_update').
+
+    Parameters as in 'propagate_all' and 'likelihood_all', with 'logw' the array of log weights.
+    """
+
+    for i in prange(x.shape[0]):
+        propagate_particle(x, y, th, i, d, r, Q0, Q1, Q2, xmax, ymax, noise)
+        logw[i] += particle_log_likelihood(x[i], y[i], meas, lm, inv2d, inv2a)
@@ -47,14 +47,14 @@ if __name__ == '__main__':
     #                                      limits=[0, world.x_max, 0, world.y_max],
     #                                      process_noise=guessed_process_noise,
     #                                      measurement_noise=guessed_measurement_noise,
-    #                                      resampling_algorithm='STRATIFIED', # 'MULTINOMIAL', 'STRATIFIED'.
+    #                                      resampling_algorithm='STRATIFIED', # 'MULTINOMIAL', 'STRATIFIED', 'SYSTEMATIC'.
     #                                      number_of_effective_particles_threshold=3000/4.0)
 
     particle_filter = ParticleFilterMWR(number_of_particles=3000,
                                         limits=[0, world.x_max, 0, world.y_max],
                                         process_noise=guessed_process_noise,
                                         measurement_noise=guessed_measurement_noise,
-                                        resampling_algorithm='STRATIFIED') # 'MULTINOMIAL', 'STRATIFIED'.
+                                        resampling_algorithm='STRATIFIED') # 'MULTINOMIAL', 'STRATIFIED', 'SYSTEMATIC'.
 
     # Initialize the particles uniformly over the world with a 3D state (x, y, heading).
     particle_filter.particle_initialize_uniform_original_state_unknown()
@@ -83,9 +83,9 @@ if __name__ == '__main__':
         particle_filter.update(robot_forward_motion=robot_motion_distance,
                                robot_angular_motion=robot_rotation_angles,
                                measurements=measurements,
-                               landmarks=world.landmarks)
+                               landmarks=world.landmarks_array)
     ## ------------------------------------------------------------------------------------------------
         """Visualization."""
-        visualizer.draw_world(world, robot, particle_filter.particles, particle_filter.get_average_state(), i, hold_on=False, particle_color='r')
-        plt.pause(0.5)
+        visualizer.draw_world(world, robot, average_state=particle_filter.get_average_state(), number_of_particles=particle_filter.n_particles, i=i, hold_on=False, particle_color='r')
+        visualizer.fig.canvas.start_event_loop(0.5) # Unlike plt.pause, this does not force a full redraw.
     plt.pause(2)
@@ -1,11 +1,12 @@
 from abc import ABC, abstractmethod
-import copy
 import numpy as np
 
+import _kernels
+
 
 class ParticleFilter(ABC):
 
-    def __init__(self, number_of_particles, limits, process_noise, measurement_noise):
+    def __init__(self, number_of_particles, limits, process_noise, measurement_noise, number_of_filters=1):
         """
         Initialize the basic particle filter.
 
@@ -13,11 +14,24 @@ class ParticleFilter(ABC):
         :param limits:              List with maximum and minimum values for x and y dimension with [xmin (m), xmax (m), ymin (m), ymax (m)].
         :param process_noise:       A list of guessed standard deviation of additive zero mean Gaussian noise on [forward motion (m), rotation angles (rad)].
         :param measurement_noise:   A list of guessed standard deviation of additive zero mean Gaussian noise on [distance measurement (m), angle measurement (rad)].
+        :param number_of_filters:   Number of independent particle filters that are run as one batch on the same measurements,
+                                    e.g. for a sensitivity analysis. With more than one filter, all particle arrays get
+                                    a leading filter axis, i.e. shape (number of filters, number of particles).
         """
 
         if number_of_particles < 1:
             print("Warning: initializing particle filter with number of particles < 1: {}!".format(number_of_particles))
         self.n_particles = number_of_particles
+        self.n_filters = number_of_filters
+
+        # Shape of all the per-particle arrays.
+        if number_of_filters == 1:
+            self.particle_shape = (number_of_particles,)
+        else:
+            self.particle_shape = (number_of_filters, number_of_particles)
+
+        # Random number generator used for all sampling steps of the particle filter.
+        self.rng = np.random.default_rng()
 
         self.state_dimension = 3  # The dimension of the state vector (which consists of x, y and heading angle).
 
@@ -29,22 +43,58 @@ class ParticleFilter(ABC):
         self.process_noise = process_noise
         self.measurement_noise = measurement_noise
 
+        # Constant factors 1/(2*sigma^2) of the Gaussian measurement likelihood.
+        self._inv_2var_d = 1.0 / (2 * measurement_noise[0] ** 2)
+        self._inv_2var_a = 1.0 / (2 * measurement_noise[1] ** 2)
+
+        # Particle states and weights are stored as parallel arrays (one entry per particle).
+        # Single precision is plenty for the states given the noise levels and halves the memory traffic,
+        # the weights are kept in double precision.
+        # They start at zero until one of the 'particle_initialize_*' methods is called.
+        self.x = np.zeros(self.particle_shape, dtype=np.float32)
+        self.y = np.zeros(self.particle_shape, dtype=np.float32)
+        self.theta = np.zeros(self.particle_shape, dtype=np.float32)
+
+        # Particle weights are accumulated in the log domain ('self.log_w') to avoid underflow,
+        # 'self.w' holds the corresponding normalized weights.
+        self.log_w = np.empty(self.particle_shape)
+        self.w = np.empty(self.particle_shape)
+
+        # Maximum normalized weight (of each filter), kept up to date by the normalization.
+        self._w_max_cache = np.empty(self.particle_shape[:-1])
+        self.reset_weights()
+
+        # Preallocated buffers reused in every update step: the propagated states are written into the state
+        # buffers, which are then swapped with the state arrays (double buffering).
+        self._x_buf = np.empty(self.particle_shape, dtype=np.float32)
+        self._y_buf = np.empty(self.particle_shape, dtype=np.float32)
+        self._theta_buf = np.empty(self.particle_shape, dtype=np.float32)
+        self._w_buf = np.empty(self.particle_shape)
+        self._noise_buf = np.empty((3,) + self.particle_shape, dtype=np.float32)
+
+        # Buffers of shape (..., number of particles, number of landmarks), allocated on first use.
+        self._dx_buf = None
+        self._dy_buf = None
+        self._angle_buf = None
+
     def particle_initialize_uniform_original_state_unknown(self):
         """
         Initialize each particle uniformly over the world with a 3D state vector (x, y, heading),
         when we do not know the original state of the target object.
         """
 
-        self.particles = []
-        weight = 1.0 / self.n_particles
+        # Draw all uniform samples at once, directly into the (single precision) state arrays.
+        self.rng.random(dtype=np.float32, out=self.x)
+        self.x *= self.x_max - self.x_min
+        self.x += self.x_min
 
-        for _ in range(self.n_particles):
+        self.rng.random(dtype=np.float32, out=self.y)
+        self.y *= self.y_max - self.y_min
+        self.y += self.y_min
 
-            # Add each particle into the list.
-            self.particles.append([weight,
-                                   [np.random.uniform(self.x_min, self.x_max, 1)[0],
-                                    np.random.uniform(self.y_min, self.y_max, 1)[0],
-                                    np.random.uniform(0, 2 * np.pi, 1)[0]]])
+        self.rng.random(dtype=np.float32, out=self.theta)
+        self.theta *= 2 * np.pi
+        self.reset_weights()
 
     def particle_initialize_uniform_original_state_known(self, robot):
         """
@@ -52,169 +102,223 @@ class ParticleFilter(ABC):
         when we know the original state of the target object.
         """
 
-        self.particles = []
-        weight = 1.0 / self.n_particles
+        # Every particle starts at the robot state.
+        self.x.fill(robot.x)
+        self.y.fill(robot.y)
+        self.theta.fill(robot.theta)
+        self.reset_weights()
 
-        for _ in range(self.n_particles):
-
-            # Add each particle into the list.
-            self.particles.append([weight, [robot.x, robot.y, robot.theta]])
-
-    def validate_state(self, state):
+    def get_average_state(self):
         """
-        Validate the state to stay within the 'cyclic' world.
+        Compute average state according to all normalized-weighted particle states.
 
-        :param state: Input particle state.
-        :return: Validated particle state.
+        :return: Average x-position, y-position and heading angle (lists with one value per filter for batched filters).
         """
 
-        # Make sure the roboter position do not exceed allowed limits (assuming cyclic world).
-        state[0] = np.mod(state[0], self.x_max)
-        state[1] = np.mod(state[1], self.y_max)
+        # Compute weighted average of particle states (one dot product per filter).
+        avg_x = np.einsum('...n,...n->...', self.w, self.x)
+        avg_y = np.einsum('...n,...n->...', self.w, self.y)
 
-        # Make sure the roboter heading angle stays within [-pi, pi].
-        state[2] = np.mod(state[2], 2*(np.pi))
+        # The heading angle is averaged on the unit circle, since a plain weighted mean is wrong near the 0/2*pi wrap.
+        avg_sin = np.einsum('...n,...n->...', self.w, np.sin(self.theta))
+        avg_cos = np.einsum('...n,...n->...', self.w, np.cos(self.theta))
+        avg_theta = np.mod(np.arctan2(avg_sin, avg_cos), 2 * np.pi)
 
-        return state
+        return [avg_x.tolist(), avg_y.tolist(), avg_theta.tolist()]
 
-    def get_average_state(self):
+    def reset_weights(self, filters=Ellipsis):
         """
-        Compute average state according to all normalized-weighted particle states.
+        Set uniform weights for all the particles.
 
-        :return: Average x-position, y-position and heading angle.
+        :param filters: Boolean (array) selecting the filters whose weights are reset (default: all).
         """
 
-        # Compute weighted average of particle states.
-        avg_x = 0.0
-        avg_y = 0.0
-        avg_theta = 0.0
-        for weighted_sample in self.particles:
-            avg_x     += weighted_sample[0] * weighted_sample[1][0]
-            avg_y     += weighted_sample[0] * weighted_sample[1][1]
-            avg_theta += weighted_sample[0] * weighted_sample[1][2]
+        self.log_w[filters] = -np.log(self.n_particles)
+        self.w[filters] = 1.0 / self.n_particles
+        self._w_max_cache[filters] = 1.0 / self.n_particles
 
-        return [avg_x, avg_y, avg_theta]
-
-    @staticmethod
-    def normalize_weights(weighted_samples):
+    def normalize_weights(self):
         """
-        Particle weights normalization.
-
-        :param weighted_samples: A list of (unnormalized weight, particle state)-lists, whose element is the unnormalized weight and the state of each particle.
-        :return                  A list of (normalized weight, particle state)-lists, whose element is the normalized weight and the state of each particle.
+        Particle weights normalization in the log domain (log-sum-exp), which also updates 'self.w'.
         """
 
-        sum_weights = 0.0
-        for weighted_sample in weighted_samples:
-            sum_weights += weighted_sample[0]
+        max_log_weight = self.log_w.max(axis=-1, keepdims=True)
 
         """Check for reinitialization."""
-        # Check if the sum of all the particle weights is too small,
+        # Check if no particle weight is left at all,
         # which means that all the particles are far away from the target (very poor estimation).
-        if sum_weights < 1e-7:
-            print("Weight normalization failed: sum of all weights is {} (weights will be reinitialized).".format(sum_weights))
+        failed = ~np.isfinite(max_log_weight[..., 0])
+        if failed.any():
+            print("Weight normalization failed: maximum log weight is {} (weights will be reinitialized).".format(max_log_weight[..., 0][failed]))
 
-            # Reinitialize weights of all the particles uniformly.
-            return [[1.0 / len(weighted_samples), weighted_sample[1]] for weighted_sample in weighted_samples]
+            # Reinitialize weights of all the particles of the failed filters uniformly.
+            self.reset_weights(failed)
+            max_log_weight = self.log_w.max(axis=-1, keepdims=True)
 
-        # Return normalized weight for each particle.
-        return [[weighted_sample[0] / sum_weights, weighted_sample[1]] for weighted_sample in weighted_samples]
+        # Subtract the maximum log weight before exponentiating for numerical stability.
+        np.subtract(self.log_w, max_log_weight, out=self.w)
+        np.exp(self.w, out=self.w)
+        sum_weights = self.w.sum(axis=-1, keepdims=True)
 
-    def propagate_sample(self, sample, desired_distance, desired_rotation):
-        """
-        Propagate an individual particle based on its process model that assumes
-        the robot first moves 'desired_distance' (m) in the direction of its original heading
-        and then rotates 'desired_rotation' (rad). Return the propagated particle state.
-        (Old particle state → Prediction: process model + desired movements → Estimated particle state)
+        self.log_w -= max_log_weight + np.log(sum_weights)
+        self.w /= sum_weights
 
-        A process model that encodes prior knowledge on how the state x_k is expected to evolve over time.
+        # The largest shifted weight is exp(0) = 1, hence the maximum normalized weight comes for free.
+        np.divide(1.0, sum_weights[..., 0], out=self._w_max_cache)
 
-        :param sample:           A list of 3 state values ([x, y, heading angle]) of the particle before prediction.
-        :param desired_distance: Desired forward motion distance (m).
-        :param desired_rotation: Desired rotation angle (rad) for the robot to perform.
-        :return:                 A list of 3 state values ([x, y, heading angle]) of the particle after prediction.
+    def resample_states(self, indices, filters=True):
+        """
+        Replace the particle states by the states of their resampled ancestors and reset the weights uniformly.
+        The ancestor states are gathered into the preallocated state buffers, which are then swapped with the state arrays.
+
+        :param indices: Array of indices of the resampled particles (ancestry vector, one row per filter for batched filters).
+        :param filters: Boolean (array) selecting the filters that are resampled (default: all).
         """
 
-        propagated_sample = copy.deepcopy(sample)
+        if self.n_filters > 1:
+            # Batched filters: filters that are not resampled keep their own particles,
+            # the row offsets turn the per-filter indices into indices of the flattened arrays.
+            filters = np.broadcast_to(np.asarray(filters), self.particle_shape[:-1])
+            indices = np.where(filters[:, None], indices, np.arange(self.n_particles))
+            indices = indices + self.n_particles * np.arange(self.n_filters)[:, None]
 
-        # 1. move forward.
-        # Compute forward motion by combining deterministic forward motion with additive zero mean Gaussian noise
-        forward_displacement = np.random.normal(desired_distance, self.process_noise[0], 1)[0]
-        propagated_sample[0] += forward_displacement * np.cos(propagated_sample[2])
-        propagated_sample[1] += forward_displacement * np.sin(propagated_sample[2])
+        np.take(self.x, indices, out=self._x_buf)
+        np.take(self.y, indices, out=self._y_buf)
+        np.take(self.theta, indices, out=self._theta_buf)
 
-        # 2. rotate by given amount plus additive noise sample (index 1 is angular noise standard deviation)
-        propagated_sample[2] += np.random.normal(desired_rotation, self.process_noise[1], 1)[0]
+        self.x, self._x_buf = self._x_buf, self.x
+        self.y, self._y_buf = self._y_buf, self.y
+        self.theta, self._theta_buf = self._theta_buf, self.theta
 
-        # Make sure we stay within cyclic world.
-        return self.validate_state(propagated_sample)
+        self.reset_weights(filters)
 
-    def propagate_sample_Q(self, sample, desired_distance, desired_rotation, Q):
+    def propagate_all(self, desired_distance, desired_rotation, Q):
         """
-        Propagate an individual particle based on its process model that assumes
+        Propagate all particles based on the process model that assumes
         the robot first moves 'desired_distance' (m) in the direction of its original heading
-        and then rotates 'desired_rotation' (rad). Return the propagated particle state.
-        (Old particle state → Prediction: process model + desired movements → Estimated particle state)
+        and then rotates 'desired_rotation' (rad).
+        (Old particle states → Prediction: process model + desired movements → Estimated particle states)
 
         A process model that encodes prior knowledge on how the state x_k is expected to evolve over time.
 
-        :param sample:           A list of 3 state values ([x, y, heading angle]) of the particle before prediction.
         :param desired_distance: Desired forward motion distance (m).
         :param desired_rotation: Desired rotation angle (rad) for the robot to perform.
         :Q:                      A list of guessed standard deviations of zero mean Gaussian additive noise
                                  on [moving along x-axis (m), moving along y-axis (m), turning actions (rad)].
-        :return:                 A list of 3 state values ([x, y, heading angle]) of the particle after prediction.
         """
 
-        propagated_sample = []
+        # The covariance is diagonal, so each dimension is perturbed independently.
+        noise = self.rng.standard_normal(dtype=np.float32, out=self._noise_buf)
 
-        mean = [sample[0] + desired_distance * np.cos(sample[2]),
-                sample[1] + desired_distance * np.sin(sample[2]),
-                sample[2] + desired_rotation]
+        if _kernels.NUMBA_AVAILABLE:
+            # The kernels work per particle, hence batched filters are simply flattened.
+            _kernels.propagate_all(self.x.reshape(-1), self.y.reshape(-1), self.theta.reshape(-1),
+                                   desired_distance, desired_rotation, Q[0], Q[1], Q[2], self.x_max, self.y_max,
+                                   noise.reshape(3, -1))
+            return
 
-        cov = [[Q[0]**2, 0,       0      ],
-               [0,       Q[1]**2, 0      ],
-               [0,       0,       Q[2]**2]]
+        nx, ny, nth = self._x_buf, self._y_buf, self._theta_buf
 
-        multi_normal = np.random.multivariate_normal(mean, cov, 1)
-        propagated_sample.append(multi_normal[0][0])
-        propagated_sample.append(multi_normal[0][1])
-        propagated_sample.append(multi_normal[0][2])
+        np.cos(self.theta, out=nx)
+        nx *= desired_distance
+        nx += self.x
+        noise[0] *= Q[0]
+        nx += noise[0]
 
-        return self.validate_state(propagated_sample)
+        np.sin(self.theta, out=ny)
+        ny *= desired_distance
+        ny += self.y
+        noise[1] *= Q[1]
+        ny += noise[1]
 
-    def compute_likelihood(self, sample, measurement, landmarks):
-        """
-        Compute likelihood for the current state.
-        (Estimated particle state → Update: measurement model + measurements → Updated particle state)
+        np.add(self.theta, desired_rotation, out=nth)
+        noise[2] *= Q[2]
+        nth += noise[2]
 
-        :param sample:      A list of 3 state values ([x, y, heading angle]) of the particle after prediction.
-        :param measurement: Actual measurements of perturbed robot distance and angle in the new position 'z_k'.
-        :param landmarks:   Absolute positions of landmarks in the world (m).
-        :return             Likelihood based on all landmark measurements.
-        """
+        # Make sure we stay within cyclic world.
+        np.mod(nx, self.x_max, out=nx)
+        np.mod(ny, self.y_max, out=ny)
+        np.mod(nth, 2 * np.pi, out=nth)
+
+        # Swap the propagated states in, the old state arrays become the buffers for the next step.
+        self.x, self._x_buf = nx, self.x
+        self.y, self._y_buf = ny, self.y
+        self.theta, self._theta_buf = nth, self.theta
 
-        likelihood_sample = 1.0
+    def compute_log_likelihood_all(self, measurements, landmarks):
+        """
+        Compute log-likelihood for the current states of all particles.
+        (Estimated particle states → Update: measurement model + measurements → Updated particle states)
 
-        # Loop over each landmark.
-        for i, lm in enumerate(landmarks):
+        :param measurements: Actual measurements of perturbed robot distance and angle in the new position 'z_k'.
+        :param landmarks:    Absolute positions of landmarks in the world (m).
+        :return              Array with the log-likelihood of each particle based on all landmark measurements
+                             (a buffer that is overwritten by the next call).
+        """
 
-            """Expected measurements using the measurement model for each independent dimension."""
-            dx = sample[0] - lm[0]
-            dy = sample[1] - lm[1]
-            expected_distance = np.sqrt(dx*dx + dy*dy)
-            expected_angle = np.arctan2(dy, dx)
+        lm = np.asarray(landmarks, dtype=np.float32)
+        meas = np.asarray(measurements, dtype=np.float32)
+
+        if _kernels.NUMBA_AVAILABLE:
+            log_likelihood = _kernels.likelihood_all(self.x.reshape(-1), self.y.reshape(-1), meas, lm,
+                                                     self._inv_2var_d, self._inv_2var_a)
+            return log_likelihood.reshape(self.particle_shape)
+
+        shape = self.particle_shape + (lm.shape[0],)
+        if self._dx_buf is None or self._dx_buf.shape != shape:
+            self._dx_buf = np.empty(shape, dtype=np.float32)
+            self._dy_buf = np.empty(shape, dtype=np.float32)
+            self._angle_buf = np.empty(shape, dtype=np.float32)
+        dx, dy, angle = self._dx_buf, self._dy_buf, self._angle_buf
+
+        """Expected measurements using the measurement model for each independent dimension."""
+        # Shape (..., number of particles, number of landmarks).
+        np.subtract(self.x[..., None], lm[:, 0], out=dx)
+        np.subtract(self.y[..., None], lm[:, 1], out=dy)
+        np.arctan2(dy, dx, out=angle)  # Expected angle.
+        np.hypot(dx, dy, out=dx)       # Expected distance.
+
+        """Log-likelihood for each independent dimension, summed over all landmarks."""
+        np.subtract(meas[:, 0], dx, out=dx)
+        dx *= dx
+        dx *= self._inv_2var_d
+        np.subtract(meas[:, 1], angle, out=angle)
+        angle *= angle
+        angle *= self._inv_2var_a
+        dx += angle
+
+        log_likelihood = np.sum(dx, axis=-1, out=self._w_buf)
+        np.negative(log_likelihood, out=log_likelihood)
+
+        return log_likelihood
+
+    def predict_and_update(self, desired_distance, desired_rotation, Q, measurements, landmarks):
+        """
+        Propagate all particles (see 'propagate_all') and multiply their weights with the likelihoods of the
+        propagated states (see 'compute_log_likelihood_all'). With Numba both steps are fused into a single pass.
 
-            """Likelihood for each independent dimension."""
-            p_z_given_expected_distance = \
-                np.exp(-(measurement[i][0] - expected_distance) ** 2 / (2 * self.measurement_noise[0] ** 2))
+        :param desired_distance: Desired forward motion distance (m).
+        :param desired_rotation: Desired rotation angle (rad) for the robot to perform.
+        :Q:                      A list of guessed standard deviations of zero mean Gaussian additive noise
+                                 on [moving along x-axis (m), moving along y-axis (m), turning actions (rad)].
+        :param measurements:     Actual measurements of perturbed robot distance and angle in the new position 'z_k'.
+        :param landmarks:        Absolute positions of landmarks in the world (m).
+        """
 
-            p_z_given_expected_angle = \
-                np.exp(-(measurement[i][1] - expected_angle) ** 2 / (2 * self.measurement_noise[1] ** 2))
+        if _kernels.NUMBA_AVAILABLE:
+            noise = self.rng.standard_normal(dtype=np.float32, out=self._noise_buf)
+            _kernels.sir_step(self.x.reshape(-1), self.y.reshape(-1), self.theta.reshape(-1), self.log_w.reshape(-1),
+                              desired_distance, desired_rotation, Q[0], Q[1], Q[2],
+                              np.asarray(measurements, dtype=np.float32), np.asarray(landmarks, dtype=np.float32),
+                              self._inv_2var_d, self._inv_2var_a, self.x_max, self.y_max, noise.reshape(3, -1))
+            return
 
-            likelihood_sample *= p_z_given_expected_distance * p_z_given_expected_angle
+        """Prediction."""
+        self.propagate_all(desired_distance, desired_rotation, Q)
 
-        return likelihood_sample
+        """Update."""
+        # Multiply the weights of the particles before update with the likelihoods of the propagated states (in the log domain).
+        self.log_w += self.compute_log_likelihood_all(measurements, landmarks)
 
     @abstractmethod
     def update(self, robot_forward_motion, robot_angular_motion, measurements, landmarks):
@@ -10,16 +10,19 @@ class ParticleFilterMWR(ParticleFilterSIR):
                  process_noise,
                  measurement_noise,
                  resampling_algorithm,
-                 resampling_threshold=1/0.005):
+                 resampling_threshold=1/0.005,
+                 number_of_filters=1):
         """
         Initialize a particle filter that performs resampling whenever the reciprocal of the maximum particle weight
         among all the particle weights falls below a user-specified threshold value.
 
         :param resampling_threshold: Define the user-specified threshold value.
+        :param number_of_filters:    Number of independent particle filters run as one batch (see 'ParticleFilter').
         """
 
         # Initialize SIR particle filter class.
-        ParticleFilterSIR.__init__(self, number_of_particles, limits, process_noise, measurement_noise, resampling_algorithm)
+        ParticleFilterSIR.__init__(self, number_of_particles, limits, process_noise, measurement_noise, resampling_algorithm,
+                                   number_of_filters=number_of_filters)
 
         self.resampling_threshold = resampling_threshold
 
@@ -29,13 +32,8 @@ class ParticleFilterMWR(ParticleFilterSIR):
         estimate. Resampling only occurs if the reciprocal of the maximum particle weight falls below the user-specified
         threshold.
 
-        :return: Boolean indicating whether or not resampling is needed.
+        :return: Boolean indicating whether or not resampling is needed (one per filter for batched filters).
         """
 
-        max_weight = 0
-
-        # Loop over all the normalized particle weights.
-        for par in self.particles:
-            max_weight = max(max_weight, par[0])
-
-        return (1.0 / max_weight) < self.resampling_threshold
+        # The maximum normalized weight is tracked by the weight normalization, no need to scan the weights again.
+        return (1.0 / self._w_max_cache) < self.resampling_threshold
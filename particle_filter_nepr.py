@@ -10,30 +10,29 @@ class ParticleFilterNEPR(ParticleFilterSIR):
                  process_noise,
                  measurement_noise,
                  resampling_algorithm,
-                 number_of_effective_particles_threshold):
+                 number_of_effective_particles_threshold,
+                 number_of_filters=1):
         """
         Initialize a particle filter that performs resampling whenever the approximated number of effective particles
-        falls below a user-specified threshold value.
+        falls below a user-specified threshold value. This is the adaptive resampling scheme of the SIR particle filter,
+        which is kept under its own name.
 
         :param number_of_effective_particles_threshold: Define the user-specified threshold value.
+        :param number_of_filters:                       Number of independent particle filters run as one batch (see 'ParticleFilter').
         """
 
         # Initialize SIR particle filter class.
-        ParticleFilterSIR.__init__(self, number_of_particles, limits, process_noise, measurement_noise, resampling_algorithm)
+        ParticleFilterSIR.__init__(self, number_of_particles, limits, process_noise, measurement_noise, resampling_algorithm,
+                                   ess_threshold=number_of_effective_particles_threshold, number_of_filters=number_of_filters)
 
-        self.resampling_threshold = number_of_effective_particles_threshold
-
-    def needs_resampling(self):
+    @property
+    def resampling_threshold(self):
         """
-        This method determines whether or not a resampling is needed for the current particle filter state
-        estimate. Resampling only occurs if the approximated number of effective particles falls below the
-        user-specified threshold.
-
-        :return: Boolean indicating whether or not resampling is needed.
+        Alias of 'ess_threshold', under which the threshold used to be stored.
         """
 
-        sum_weights_squared = 0
-        for par in self.particles:
-            sum_weights_squared += par[0] ** 2
+        return self.ess_threshold
 
-        return (1.0 / sum_weights_squared) < self.resampling_threshold
+    @resampling_threshold.setter
+    def resampling_threshold(self, value):
+        self.ess_threshold = value
@@ -1,5 +1,6 @@
 from particle_filter_base import ParticleFilter
 from resampling_algos import *
+import numpy as np
 
 
 class ParticleFilterSIR(ParticleFilter):
@@ -9,27 +10,38 @@ class ParticleFilterSIR(ParticleFilter):
                  limits,
                  process_noise,
                  measurement_noise,
-                 resampling_algorithm):
+                 resampling_algorithm,
+                 ess_threshold=None,
+                 number_of_filters=1):
         """
         Initialize a SIR particle filter using the 'ParticleFilter' class.
 
-        :param resampling_algorithm: Define a resampling algorithm (based on the selected resampling scheme 'needs_resampling').
+        :param resampling_algorithm: Define a resampling algorithm (based on the selected resampling scheme 'needs_resampling'):
+                                     'MULTINOMIAL', 'STRATIFIED' or 'SYSTEMATIC'.
+        :param ess_threshold:        Resample whenever the approximated number of effective particles falls below this value
+                                     (default: half the number of particles, 'np.inf' resamples in every step).
+        :param number_of_filters:    Number of independent particle filters run as one batch (see 'ParticleFilter').
         """
 
         # Initialize particle filter base class.
-        ParticleFilter.__init__(self, number_of_particles, limits, process_noise, measurement_noise)
+        ParticleFilter.__init__(self, number_of_particles, limits, process_noise, measurement_noise, number_of_filters)
 
         # Set SIR specific properties.
         self.resampling_algorithm = resampling_algorithm
 
+        if ess_threshold is None:
+            ess_threshold = number_of_particles / 2.0
+        self.ess_threshold = ess_threshold
+
     def needs_resampling(self):
         """
         This method determines whether or not a resampling step is needed for the current time step.
 
-        :return: Boolean indicating whether or not resampling is needed.
-                 (The SIR particle filter resamples every time step, hence it always returns true.)
+        :return: Boolean indicating whether or not resampling is needed (one per filter for batched filters).
+                 (The SIR particle filter resamples adaptively, i.e. only if the approximated number of effective
+                 particles falls below 'ess_threshold'.)
         """
-        return True
+        return 1.0 / np.sum(self.w * self.w, axis=-1) < self.ess_threshold
 
     def update(self, robot_forward_motion, robot_angular_motion, measurements, landmarks):
         """
@@ -41,27 +53,13 @@ class ParticleFilterSIR(ParticleFilter):
         :param landmarks:            Landmark positions for calculating the expected measurements.
         """
 
-        new_particles = []
-
-        # Loop over all particles.
-        for par in self.particles:
-
-            """Prediction."""
-            # 'par[1]':           A list of 3 state values ([x, y, heading angle]) of the particle before prediction.
-            # 'propagated_state': A list of 3 state values ([x, y, heading angle]) of the particle after prediction.
-            propagated_state = self.propagate_sample_Q(par[1], robot_forward_motion, robot_angular_motion, [0.07, 0.07, 0.1])
-
-            """Update."""
-            # 'par[0]': The weight of the particle before update.
-            # 'weight': The weight of the particle after update.
-            weight = par[0] * self.compute_likelihood(propagated_state, measurements, landmarks)
-
-            # Store all new calculations in a list.
-            new_particles.append([weight, propagated_state])
+        """Prediction and update."""
+        self.predict_and_update(robot_forward_motion, robot_angular_motion, [0.07, 0.07, 0.1], measurements, landmarks)
 
         """Particle weights normalization."""
-        self.particles = self.normalize_weights(new_particles)
+        self.normalize_weights()
 
         """Check for resampling"""
-        if self.needs_resampling():
-            self.particles = resample(self.particles, self.n_particles, self.resampling_algorithm)
+        resample_filters = self.needs_resampling()
+        if np.any(resample_filters):
+            self.resample_states(resample(self.w, self.n_particles, self.resampling_algorithm, self.rng), resample_filters)
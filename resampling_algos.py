@@ -1,104 +1,110 @@
 import numpy as np
-import copy
 
 
-def naive_search(cumulative_list, x):
+def batched_search(Q, u):
     """
-    Find the smallest index 'i' of the 'cumulative_list' list,
-    for which 'x' <= 'cumulative_list[i]' holds.
+    Find for each element 'x' of 'u' the smallest index 'i' of the cumulative array 'Q',
+    for which 'x' <= 'Q[i]' holds (binary search). Batched filters are handled row by row.
 
-    :param cumulative_list: List of elements that increase with increasing index, e.g. [0.1, 0.2, 0.9, 1.0].
-    :param x:               Value to be checked.
-    :return:                Index of the 'cumulative_list' list.
+    :param Q: Array of elements that increase with increasing index along the last axis, e.g. [0.1, 0.2, 0.9, 1.0].
+    :param u: Array of values to be checked (same leading shape as 'Q').
+    :return:  Array of indices along the last axis of 'Q'.
     """
 
-    m = 0
-    while cumulative_list[m] < x:
-        m += 1
-    return m
+    if Q.ndim == 1:
+        return np.searchsorted(Q, u)
 
+    # Shift every row by its row number, so that the flattened cumulative sums stay sorted.
+    offsets = np.arange(Q.shape[0])[:, None]
+    indices = np.searchsorted((Q + offsets).ravel(), (u + offsets).ravel()).reshape(u.shape)
+    return indices - offsets * Q.shape[1]
 
-def resample(samples, N, algorithm):
+
+def resample(weights, N, algorithm, rng):
     """
     Resampling interface, perform resampling using specified method.
 
-    :param samples:   A list of (normalized weight, particle state)-lists before resampling.
+    :param weights:   Array of normalized particle weights before resampling (one row per filter for batched filters).
     :param N:         Number of samples that must be resampled after resampling.
     :param algorithm: Preferred resampling method.
-    :return:          A list of (uniform weight, particle state)-lists after resampling.
+    :param rng:       Random number generator ('numpy.random.Generator').
+    :return:          Array of indices of the resampled particles (uniform weights after resampling).
     """
 
     if algorithm == 'MULTINOMIAL':
-        return multinomial(samples, N)
+        return multinomial(weights, N, rng)
     elif algorithm == 'STRATIFIED':
-        return stratified(samples, N)
+        return stratified(weights, N, rng)
+    elif algorithm == 'SYSTEMATIC':
+        return systematic(weights, N, rng)
 
-def multinomial(samples, N):
+def multinomial(weights, N, rng):
     """
     Particles are sampled with replacement proportional to their weights and in arbitrary order.
     This leads to a maximum variance on the number of times a particle will be resampled,
     since any particle will be resampled between 0 and N times.
 
-    :param samples: A list of (normalized weight, particle state)-lists before resampling.
+    :param weights: Array of normalized particle weights before resampling (one row per filter for batched filters).
     :param N:       Number of particles that must be resampled.
-    :return:        A list of (normalized/uniform weight, particle state)-lists after resampling.
+    :param rng:     Random number generator ('numpy.random.Generator').
+    :return:        Array of indices of the resampled particles.
     """
 
     # Compute cumulative sum on normalized weights (which forms a discrete probability distribution).
-    weights = [weighted_sample[0] for weighted_sample in samples]
-    Q = np.cumsum(weights).tolist()
-
-    # A list to store new particles with weights and states.
-    new_samples = []
-
-    for _ in range(N):
-
-        # Draw a random sample 'u' from [0, 1).
-        u = np.random.uniform(1e-10, 1, 1)[0]
-    ## --------------------------------------------------------------------------------------
-        # Find the smallest index 'm' of the cumulative list 'Q', for which
-        # 'Q[m-1]' < 'u' <= 'Q[m]]' < 'Q[m+1]'.
-        m = naive_search(Q, u)
+    Q = np.cumsum(weights, axis=-1)
+    Q[..., -1] = 1.0  # Guard against round-off errors.
 
-        # Add copy of the state sample (uniform weights).
-        new_samples.append([1.0/N, copy.deepcopy(samples[m][1])])
+    # Draw N random samples 'u' from [0, 1).
+    u = rng.uniform(1e-10, 1, weights.shape[:-1] + (N,))
+## --------------------------------------------------------------------------------------
+    # Find (binary search) for each 'u' the smallest index 'm' of the cumulative array 'Q', for which
+    # 'Q[m-1]' < 'u' <= 'Q[m]]' < 'Q[m+1]'.
+    return batched_search(Q, u)
 
-    return new_samples
-
-def stratified(samples, N):
+def stratified(weights, N, rng):
     """
     Stratified random sampling is a method of sampling,
     dividing a range of possibility [0, 1) into smaller strata
     with a range of [1e-10 + float(n) * 1 / N, 1.0 / N + float(n) * 1 / N) (integer n = 0, 1, 2, ...).
 
-    :param samples: A list of (normalized weight, particle state)-lists before resampling.
+    :param weights: Array of normalized particle weights before resampling (one row per filter for batched filters).
     :param N:       Number of particles that must be resampled.
-    :return:        A list of (normalized/uniform weight, particle state)-lists after resampling.
+    :param rng:     Random number generator ('numpy.random.Generator').
+    :return:        Array of indices of the resampled particles.
     """
 
     # Compute cumulative sum on normalized weights (which forms a discrete probability distribution).
-    weights = [weighted_sample[0] for weighted_sample in samples]
-    Q = np.cumsum(weights).tolist()
-
-    n = 0
-    new_samples = []
-    while n < N:
-
-        # Draw a random sample 'u0' from [0, 1.0/N].
-        u0 = np.random.uniform(1e-10, 1.0 / N, 1)[0]
-
-        # There is a random sample in every strata [1e-10 + float(n) * 1 / N, 1.0 / N + float(n) * 1 / N).
-        # Integer n = 0, 1, 2, ...
-        u = u0 + float(n) * 1 / N
-    ## --------------------------------------------------------------------------------------
-        # Find the smallest index 'm' of the cumulative list 'Q', for which
-        # 'Q[m-1]' < 'u' <= 'Q[m]' < 'Q[m+1]'.
-        m = naive_search(Q, u)
-
-        # Add copy of the state sample (uniform weights).
-        new_samples.append([1.0/N, copy.deepcopy(samples[m][1])])
+    Q = np.cumsum(weights, axis=-1)
+    Q[..., -1] = 1.0  # Guard against round-off errors.
+
+    # There is a random sample in every strata [1e-10 + float(n) * 1 / N, 1.0 / N + float(n) * 1 / N).
+    # Integer n = 0, 1, 2, ...
+    u = (np.arange(N) + rng.uniform(1e-10, 1.0, weights.shape[:-1] + (N,))) / N
+## --------------------------------------------------------------------------------------
+    # Find (binary search) for each 'u' the smallest index 'm' of the cumulative array 'Q', for which
+    # 'Q[m-1]' < 'u' <= 'Q[m]' < 'Q[m+1]'.
+    return batched_search(Q, u)
+
+def systematic(weights, N, rng):
+    """
+    Systematic sampling (low variance sampling) is similar to stratified sampling,
+    but draws a single random sample 'u0' from [0, 1.0/N) that is shared by all the strata.
+    This leads to a lower variance on the number of times a particle will be resampled.
 
-        # Added another sample
-        n += 1
+    :param weights: Array of normalized particle weights before resampling (one row per filter for batched filters).
+    :param N:       Number of particles that must be resampled.
+    :param rng:     Random number generator ('numpy.random.Generator').
+    :return:        Array of indices of the resampled particles.
+    """
 
-    return new_samples
+    # Compute cumulative sum on normalized weights (which forms a discrete probability distribution).
+    Q = np.cumsum(weights, axis=-1)
+    Q[..., -1] = 1.0  # Guard against round-off errors.
+
+    # Draw a single random sample 'u0' from [0, 1.0/N] and shift it into every strata.
+    u0 = rng.uniform(1e-10, 1.0 / N, weights.shape[:-1] + (1,))
+    u = u0 + np.arange(N) / N
+## --------------------------------------------------------------------------------------
+    # Find (binary search) for each 'u' the smallest index 'm' of the cumulative array 'Q', for which
+    # 'Q[m-1]' < 'u' <= 'Q[m]' < 'Q[m+1]'.
+    return batched_search(Q, u)
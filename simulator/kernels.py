@@ -0,0 +1,67 @@
+import math
+
+# Numba is optional: without it the batched robot methods fall back to their vectorized NumPy implementation.
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        return lambda func: func
+
+    prange = range
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def move_particles(xs, ys, thetas, d_arr, r_arr, x_max, y_max):
+    """
+    Move all particles in place (see 'Robot.move_batch').
+
+    :param xs, ys, thetas: Arrays with the x-positions, y-positions and heading angles of the particles.
+    :param d_arr:          Array with the true forward distance of each particle (m).
+    :param r_arr:          Array with the true rotation angle of each particle (rad).
+    :param x_max, y_max:   World dimensions of the cyclic world (m).
+    """
+
+    for i in prange(xs.size):
+        xs[i] = (xs[i] + d_arr[i] * math.cos(thetas[i])) % x_max
+        ys[i] = (ys[i] + d_arr[i] * math.sin(thetas[i])) % y_max
+        thetas[i] = (thetas[i] + r_arr[i]) % (2 * math.pi)
+
+
+@njit(cache=True, fastmath=True, parallel=True)
+def measure_particles(xs, ys, lm_xy, noise_d, noise_a, out_dist, out_ang):
+    """
+    Perform the measurements of all particles (see 'Robot.measure_batch').
+
+    :param xs, ys:            Arrays with the x-positions and y-positions of the particles.
+    :param lm_xy:             Array of shape (number of landmarks, 2) with the landmark positions.
+    :param noise_d, noise_a:  Arrays of shape (number of particles, number of landmarks) with the distance and angle noise.
+    :param out_dist, out_ang: Arrays of shape (number of particles, number of landmarks) for the measured distances and angles.
+    """
+
+    for i in prange(xs.size):
+        for j in range(lm_xy.shape[0]):
+            dx = xs[i] - lm_xy[j, 0]
+            dy = ys[i] - lm_xy[j, 1]
+            out_dist[i, j] = math.hypot(dx, dy) + noise_d[i, j]
+            out_ang[i, j] = math.atan2(dy, dx) + noise_a[i, j]
+
+
+@njit(cache=True, parallel=True)
+def copy_from_ancestors(xs, ys, thetas, ancestors):
+    """
+    Copy every particle state from its ancestor in place (see 'resample.resample_inplace').
+    Each ancestor keeps its own slot, so the order of the copies does not matter.
+
+    :param xs, ys, thetas: Arrays with the x-positions, y-positions and heading angles of the particles.
+    :param ancestors:      Array of ancestor indices with 'ancestors[a] == a' for every ancestor 'a'.
+    """
+
+    for i in prange(xs.size):
+        a = ancestors[i]
+        if a != i:
+            xs[i] = xs[a]
+            ys[i] = ys[a]
+            thetas[i] = thetas[a]
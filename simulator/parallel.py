@@ -0,0 +1,120 @@
+import os
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from types import SimpleNamespace
+
+import numpy as np
+from .robot import Robot
+
+
+# World seen by a worker process, with the landmark array backed by the shared memory block.
+_worker_world = None
+_worker_shm = None
+
+
+def _init_worker(shm_name, shape, dtype, x_max, y_max):
+    """
+    Attach a worker process to the shared landmark array.
+
+    :param shm_name:     Name of the shared memory block holding the landmark array.
+    :param shape, dtype: Shape and data type of the landmark array.
+    :param x_max, y_max: World dimensions (m).
+    """
+
+    global _worker_world, _worker_shm
+    _worker_shm = SharedMemory(name=shm_name)
+    landmarks_array = np.ndarray(shape, dtype=dtype, buffer=_worker_shm.buf)
+    _worker_world = SimpleNamespace(x_max=x_max, y_max=y_max, landmarks_array=landmarks_array)
+
+
+def _advance_chunk(xs, ys, thetas, desired_distance, desired_rotation, process_noise, measurement_noise, seed):
+    """
+    Move and measure one chunk of robots (e.g. particles) inside a worker process.
+
+    :param xs, ys, thetas:    Arrays with the x-positions, y-positions and heading angles of the chunk.
+    :param desired_distance:  Desired forward motion (m).
+    :param desired_rotation:  Desired rotation angle (rad).
+    :param process_noise:     Standard deviations (forward, turn) of the motion noise.
+    :param measurement_noise: Standard deviations (distance, angle) of the measurement noise.
+    :param seed:              Seed of the random number generator of this chunk.
+    :return: Moved positions and heading angles, and measured distances and angles of the chunk.
+    """
+
+    # Draw the motion and measurement noise of the whole chunk at once.
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((xs.size, 2 + 2 * _worker_world.landmarks_array.shape[0]), dtype=xs.dtype)
+
+    Robot.move_batch(xs, ys, thetas, desired_distance, desired_rotation, _worker_world, rng, *process_noise,
+                     noise=noise[:, :2])
+    z_distance, z_angle = Robot.measure_batch(xs, ys, _worker_world, rng, *measurement_noise, noise=noise[:, 2:])
+    return xs, ys, thetas, z_distance, z_angle
+
+
+class ParallelSimulator:
+
+    def __init__(self, world, number_of_workers=None, seed=None):
+        """
+        Advance large batches of robots (e.g. particles) on a pool of worker processes.
+        The landmark array of the world is placed in shared memory once, so only the particle chunks are sent to the workers.
+
+        :param world:             World the robots live in.
+        :param number_of_workers: Number of worker processes (defaults to the number of cores).
+        :param seed:              Seed from which independent random streams for all chunks are derived.
+        """
+
+        self.n_workers = number_of_workers or os.cpu_count()
+        self._seed_sequence = np.random.SeedSequence(seed)
+
+        # Copy the landmark array into shared memory.
+        landmarks = world.landmarks_array
+        self._shm = SharedMemory(create=True, size=landmarks.nbytes)
+        np.ndarray(landmarks.shape, dtype=landmarks.dtype, buffer=self._shm.buf)[:] = landmarks
+
+        # Spawn fresh workers instead of forking, since forking a process that already runs (Numba) threads can deadlock.
+        self._pool = get_context('spawn').Pool(self.n_workers, initializer=_init_worker,
+                                               initargs=(self._shm.name, landmarks.shape, landmarks.dtype, world.x_max, world.y_max))
+
+    def advance(self, xs, ys, thetas, desired_distance, desired_rotation, process_noise, measurement_noise):
+        """
+        Move all robots and measure the landmarks from their new poses.
+
+        :param xs, ys, thetas:    Arrays with the x-positions, y-positions and heading angles, updated in place
+                                  (float32 halves the data moved between the processes).
+        :param desired_distance:  Desired forward motion (m).
+        :param desired_rotation:  Desired rotation angle (rad).
+        :param process_noise:     Standard deviations (forward, turn) of the motion noise.
+        :param measurement_noise: Standard deviations (distance, angle) of the measurement noise.
+        :return: Measured distances and angles, two arrays of shape (number of robots, number of landmarks).
+        """
+
+        # Every chunk gets its own independent random stream, so no two workers draw identical noise.
+        seeds = self._seed_sequence.spawn(self.n_workers)
+        chunks = zip(np.array_split(xs, self.n_workers), np.array_split(ys, self.n_workers),
+                     np.array_split(thetas, self.n_workers), seeds)
+        results = self._pool.starmap(_advance_chunk,
+                                     [(x_c, y_c, theta_c, desired_distance, desired_rotation,
+                                       process_noise, measurement_noise, seed)
+                                      for x_c, y_c, theta_c, seed in chunks])
+
+        """Gather the results."""
+        xs[:] = np.concatenate([result[0] for result in results])
+        ys[:] = np.concatenate([result[1] for result in results])
+        thetas[:] = np.concatenate([result[2] for result in results])
+        return (np.concatenate([result[3] for result in results]),
+                np.concatenate([result[4] for result in results]))
+
+    def close(self):
+        """
+        Shut down the worker processes and release the shared memory.
+        """
+
+        self._pool.close()
+        self._pool.join()
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,69 @@
+import numpy as np
+from . import kernels
+
+
+def systematic_resample(weights, rng):
+    """
+    Systematic (low variance) resampling in O(N): a single random offset is shared by N equally spaced
+    positions, which are then looked up in the cumulative weights with one binary search.
+    Follows the conventions of the particle filter's 'resampling_algos.systematic'.
+
+    :param weights: Array of particle weights of shape (number of particles,) (need not be normalized).
+    :param rng:     Random number generator ('numpy.random.Generator').
+    :return:        Array of parent indices of the resampled particles.
+    """
+
+    N = weights.size
+
+    # Compute cumulative sum on normalized weights (which forms a discrete probability distribution).
+    Q = np.cumsum(weights)
+    Q /= Q[-1]
+    Q[-1] = 1.0  # Guard against round-off errors.
+
+    # Draw a single random sample 'u0' from [0, 1.0/N] and shift it into every strata.
+    u = rng.uniform(1e-10, 1.0 / N) + np.arange(N) / N
+
+    # Find (binary search) for each 'u' the smallest index 'm' of 'Q', for which 'Q[m-1]' < 'u' <= 'Q[m]'.
+    return np.searchsorted(Q, u)
+
+
+def resample_particles(xs, ys, thetas, weights, rng):
+    """
+    Resample the particles systematically and reset their weights to uniform.
+
+    :param xs, ys, thetas: Arrays with the x-positions, y-positions and heading angles of the particles.
+    :param weights:        Array of particle weights, reset in place to 1/N.
+    :param rng:            Random number generator ('numpy.random.Generator').
+    :return: Resampled x-positions, y-positions and heading angles.
+    """
+
+    parents = systematic_resample(weights, rng)
+    weights.fill(1.0 / weights.size)
+    return xs[parents], ys[parents], thetas[parents]
+
+
+def resample_inplace(xs, ys, thetas, parents):
+    """
+    Resample the particles in place without allocating new state arrays.
+    The parent indices are first permuted such that every parent keeps its own slot,
+    then only the slots of the discarded particles are overwritten by copies of their new parents.
+
+    :param xs, ys, thetas: Arrays with the x-positions, y-positions and heading angles of the particles.
+    :param parents:        Array of parent indices, e.g. from 'systematic_resample'.
+    """
+
+    N = parents.size
+    counts = np.bincount(parents, minlength=N)
+
+    # Surviving particles are their own ancestors, the free slots take the additional copies.
+    ancestors = np.arange(N)
+    ancestors[counts == 0] = np.repeat(ancestors, np.maximum(counts - 1, 0))
+
+    if kernels.NUMBA_AVAILABLE:
+        kernels.copy_from_ancestors(xs, ys, thetas, ancestors)
+        return
+
+    replaced = np.flatnonzero(counts == 0)
+    xs[replaced] = xs[ancestors[replaced]]
+    ys[replaced] = ys[ancestors[replaced]]
+    thetas[replaced] = thetas[ancestors[replaced]]
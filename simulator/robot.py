@@ -1,5 +1,8 @@
+import math
+
 import numpy as np
 from .world import *
+from . import kernels
 
 
 class Robot:
@@ -30,6 +33,9 @@ class Robot:
         self.std_meas_distance = measurement_noise[0]
         self.std_meas_angle = measurement_noise[1]
 
+        # Random number generator for the process and measurement noise.
+        self._rng = np.random.default_rng()
+
     def move(self, desired_distance, desired_rotation, world):
         """
         Move the robot according to given arguments and within the world of given dimensions.
@@ -42,61 +48,122 @@ class Robot:
         """
 
         # Compute true forward distance of the robot.
-        distance_driven = self._get_gaussian_noise_sample(desired_distance, self.std_forward)
+        distance_driven = self._rng.normal(desired_distance, self.std_forward)
 
         # First move the robot along its heading angle for the last time point.
-        self.x += distance_driven * np.cos(self.theta)
-        self.y += distance_driven * np.sin(self.theta)
+        self.x += distance_driven * math.cos(self.theta)
+        self.y += distance_driven * math.sin(self.theta)
 
         # Positions restricted in the world with the cyclic world assumption.
-        self.x = np.mod(self.x, world.x_max)
-        self.y = np.mod(self.y, world.y_max)
+        self.x %= world.x_max
+        self.y %= world.y_max
     ## -------------------------------------------------------------------------------------------
         # Compute true rotation angle of the robot.
-        angle_rotated = self._get_gaussian_noise_sample(desired_rotation, self.std_turn)
+        angle_rotated = self._rng.normal(desired_rotation, self.std_turn)
 
         # Then update the heading angle for the current time point.
         self.theta += angle_rotated
 
         # Angles restricted in [0, 2*pi].
-        self.theta = np.mod(self.theta, 2*(np.pi))
+        self.theta %= 2*(np.pi)
 
-    def measure(self, world):
+    @staticmethod
+    def move_batch(xs, ys, thetas, desired_distance, desired_rotation, world, rng, std_fwd, std_turn, noise=None):
         """
-        Perform a measurement.
-        The robot is assumed to measure the distance to and angles
-        with respect to all landmarks in meters and radians respectively.
-        While doing so, the robot experiences zero mean additive Gaussian noise.
+        Move a batch of robots (e.g. particles) in place with the same motion model as 'move'.
 
-        :param world: World containing the landmark positions.
-        :return: A list of lists: [[dist_to_landmark1, angle_wrt_landmark1], dist_to_landmark2, angle_wrt_landmark2], ...]
+        :param xs:               Array of x-positions (m), updated in place (float32 or float64, kept throughout).
+        :param ys:               Array of y-positions (m), updated in place.
+        :param thetas:           Array of heading angles (rad), updated in place.
+        :param desired_distance: desired forward motion distance of the robots (m).
+        :param desired_rotation: desired rotation angle (rad).
+        :param world:            the cyclic world, where the robots execute their motion.
+        :param rng:              Random number generator ('numpy.random.Generator').
+        :param std_fwd:          Standard deviation of additive zero mean Gaussian noise on moving forward (m).
+        :param std_turn:         Standard deviation of additive zero mean Gaussian noise on turning actions (rad).
+        :param noise:            Optional standard normal samples of shape (xs.shape + (2,)) for the forward and
+                                 turning noise (drawn from 'rng' in a single call if not given).
         """
 
-        measurements = []
+        if noise is None:
+            noise = rng.standard_normal(xs.shape + (2,), dtype=xs.dtype)
 
-        # Loop over each landmark for measurements.
-        for lm in world.landmarks:
-            dx = self.x - lm[0]
-            dy = self.y - lm[1]
+        # Compute true forward distances and rotation angles.
+        d = desired_distance + std_fwd * noise[..., 0]
+        r = desired_rotation + std_turn * noise[..., 1]
 
-            # Measured distance perturbed by zero mean additive Gaussian noise.
-            z_distance = self._get_gaussian_noise_sample(np.sqrt(dx * dx + dy * dy), self.std_meas_distance)
-        ## -------------------------------------------------------------------------------------------
-            # Measured angle perturbed by zero mean additive Gaussian noise.
-            z_angle = self._get_gaussian_noise_sample(np.arctan2(dy, dx), self.std_meas_angle)
+        # The kernel updates flat views, so non-contiguous arrays (whose reshape would be a copy) take the NumPy path.
+        if kernels.NUMBA_AVAILABLE and all(a.flags.c_contiguous for a in (xs, ys, thetas)):
+            kernels.move_particles(xs.reshape(-1), ys.reshape(-1), thetas.reshape(-1), d.reshape(-1), r.reshape(-1),
+                                   world.x_max, world.y_max)
+            return
 
-            # Store measurement
-            measurements.append([z_distance, z_angle])
+        # First move along the heading angles for the last time point.
+        xs += d * np.cos(thetas)
+        ys += d * np.sin(thetas)
 
-        return measurements
+        # Positions restricted in the world with the cyclic world assumption.
+        np.mod(xs, world.x_max, out=xs)
+        np.mod(ys, world.y_max, out=ys)
+    ## -------------------------------------------------------------------------------------------
+        # Then update the heading angles with the true rotation angles, restricted in [0, 2*pi].
+        thetas += r
+        np.mod(thetas, 2*(np.pi), out=thetas)
 
     @staticmethod
-    def _get_gaussian_noise_sample(mu, sigma):
+    def measure_batch(xs, ys, world, rng, std_meas_distance, std_meas_angle, noise=None):
+        """
+        Perform the measurements of a batch of robots (e.g. particles) with the same measurement model as 'measure'.
+
+        :param xs:                Array of x-positions (m) of shape (number of robots,) (float32 or float64).
+        :param ys:                Array of y-positions (m) of shape (number of robots,).
+        :param world:             World containing the landmark positions.
+        :param rng:               Random number generator ('numpy.random.Generator').
+        :param std_meas_distance: Standard deviation of additive zero mean Gaussian noise on distance measurement (m).
+        :param std_meas_angle:    Standard deviation of additive zero mean Gaussian noise on angle measurement (rad).
+        :param noise:             Optional standard normal samples of shape (number of robots, 2 * number of landmarks),
+                                  distance noise first (drawn from 'rng' in a single call if not given).
+        :return: Measured distances and angles, two arrays of shape (number of robots, number of landmarks).
         """
-        Draw a random sample from an 1D Gaussian distribution with mean mu and standard deviation sigma.
 
-        :param mu:    mean               of the 1D Gaussian distribution.
-        :param sigma: standard deviation of the 1D Gaussian distribution.
-        :return:      A random sample    from the 1D Gaussian distribution.
+        # Compute in the precision of the robot positions, so that float32 batches are not upcast.
+        landmarks = world.landmarks_array.astype(xs.dtype, copy=False)
+        n_landmarks = landmarks.shape[0]
+        shape = (xs.size, n_landmarks)
+        if noise is None:
+            noise = rng.standard_normal((xs.size, 2 * n_landmarks), dtype=xs.dtype)
+        noise_d = std_meas_distance * noise[:, :n_landmarks]
+        noise_a = std_meas_angle * noise[:, n_landmarks:]
+
+        if kernels.NUMBA_AVAILABLE:
+            z_distance = np.empty(shape, dtype=xs.dtype)
+            z_angle = np.empty(shape, dtype=xs.dtype)
+            kernels.measure_particles(xs, ys, landmarks, noise_d, noise_a, z_distance, z_angle)
+            return z_distance, z_angle
+
+        dx = xs[:, None] - landmarks[:, 0]
+        dy = ys[:, None] - landmarks[:, 1]
+        return np.hypot(dx, dy) + noise_d, np.arctan2(dy, dx) + noise_a
+
+    def measure(self, world):
         """
-        return np.random.normal(loc=mu, scale=sigma, size=1)[0]
+        Perform a measurement.
+        The robot is assumed to measure the distance to and angles
+        with respect to all landmarks in meters and radians respectively.
+        While doing so, the robot experiences zero mean additive Gaussian noise.
+
+        :param world: World containing the landmark positions.
+        :return: An array of shape (number of landmarks, 2): [[dist_to_landmark1, angle_wrt_landmark1], [dist_to_landmark2, angle_wrt_landmark2], ...]
+        """
+
+        # Relative positions with respect to all landmarks at once.
+        d = np.array([self.x, self.y]) - world.landmarks_array
+        n_landmarks = d.shape[0]
+
+        # Measured distances perturbed by zero mean additive Gaussian noise.
+        z_distance = np.hypot(d[:, 0], d[:, 1]) + self._rng.normal(0.0, self.std_meas_distance, n_landmarks)
+    ## -------------------------------------------------------------------------------------------
+        # Measured angles perturbed by zero mean additive Gaussian noise.
+        z_angle = np.arctan2(d[:, 1], d[:, 0]) + self._rng.normal(0.0, self.std_meas_angle, n_landmarks)
+
+        return np.stack([z_distance, z_angle], axis=1)
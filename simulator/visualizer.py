@@ -1,11 +1,20 @@
+import math
+
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 import numpy as np
 
 
 class Visualizer:
 
-    def __init__(self, radius_robot, landmark_size):
-    
+    def __init__(self, radius_robot, landmark_size, verbose=False, text_every=10):
+        """
+        :param radius_robot:  Radius of the circle representing the robot.
+        :param landmark_size: Marker size of the landmarks.
+        :param verbose:       Boolean indicating whether the deviations are printed to the console.
+        :param text_every:    Print the deviations every this many time steps (if 'verbose').
+        """
+
         self.circle_radius_robot = radius_robot
 
         self.landmark_size = landmark_size
@@ -14,18 +23,21 @@ class Visualizer:
         self.y_margin = 1
         self.scale = 2
 
-    def draw_world(self, world, robot, particles, average_state=None, i=None, hold_on=False, particle_color='r'):
+        self.verbose = verbose
+        self.text_every = text_every
+
+        # Figure and artists, created on the first drawing and reused for all following frames.
+        self.fig = None
+        self.ax = None
+        self._world = None
+        self._background = None
+
+    def _setup(self, world):
         """
-        Draw a world with landmarks, a robot with its pose (position x, y and orientation heading angle) and
-        particles with their poses to represent the discrete probability distribution for estimation.
+        Create the figure with the static world (border, landmarks and labels) once and
+        the animated artists, which are only updated and blitted in every following frame.
 
-        :param world:          World object with its dimensions and landmarks.
-        :param robot:          Robot object with its true (perturbed) pose (position x, y and orientation heading angle).
-        :param particles:      Weighted particles (a list of [weight, [x, y, heading angle]]-lists).
-        :param average_state:  The averaged position among all the weighted particles.
-        :param i:              The current time step.
-        :param hold_on:        Boolean indicating whether figure must be kept or not.
-        :param particle_color: Color used for particles
+        :param world: World object with its dimensions and landmarks.
         """
 
         """Begin drawing."""
@@ -34,62 +46,143 @@ class Visualizer:
         y_min = -self.y_margin
         y_max = self.y_margin + world.y_max
 
-        plt.figure(num=1, figsize=((x_max-x_min) / self.scale, (y_max-y_min) / self.scale), frameon=False)
-        if not hold_on:
-            plt.clf() # Clear the current drawings.
-
-        ax=plt.gca()  #plt.gca(): get current axis.
+        # Create the figure only once, later worlds reuse it and only resize it if their dimensions differ.
+        figsize = ((x_max-x_min) / self.scale, (y_max-y_min) / self.scale)
+        if self.fig is None or not plt.fignum_exists(self.fig.number):
+            self.fig = plt.figure(num=1, figsize=figsize, frameon=False)
+        elif tuple(self.fig.get_size_inches()) != figsize:
+            self.fig.set_size_inches(figsize)
+        self.fig.clf()
+        self._world = world
+        self._background = None
+
+        ax = self.ax = self.fig.gca()  # gca(): get current axis.
         ax.spines['right'].set_color('none')
         ax.spines['left'].set_color('none')
 ## -----------------------------------------------------------------------------------------
         """Draw a world."""
-        plt.plot([0, world.x_max], [0, 0], color='k', linewidth=1, linestyle='-')                      # lower line: (0, 0) → (world.x_max, 0).
-        plt.plot([0, 0], [0, world.y_max], color='k', linewidth=1, linestyle='-')                      # left line:  (0, 0) → (0, world.y_max).
-        plt.plot([0, world.x_max], [world.y_max, world.y_max], color='k', linewidth=1, linestyle='-')  # top line:   (0, world.y_max) → (world.x_max, world.y_max).
-        plt.plot([world.x_max, world.x_max], [0, world.y_max], color='k', linewidth=1, linestyle='-')  # right line: (world.x_max, 0) → (world.x_max, world.y_max).
+        border = LineCollection([[(0, 0), (world.x_max, 0)],                       # lower line: (0, 0) → (world.x_max, 0).
+                                 [(0, 0), (0, world.y_max)],                       # left line:  (0, 0) → (0, world.y_max).
+                                 [(0, world.y_max), (world.x_max, world.y_max)],   # top line:   (0, world.y_max) → (world.x_max, world.y_max).
+                                 [(world.x_max, 0), (world.x_max, world.y_max)]],  # right line: (world.x_max, 0) → (world.x_max, world.y_max).
+                                colors='k', linewidths=1, linestyles='-')
+        ax.add_collection(border)
 
         # Set axes limits.
-        plt.xlim([x_min, x_max])
-        plt.ylim([y_min, y_max])
+        ax.set_xlim([x_min, x_max])
+        ax.set_ylim([y_min, y_max])
 
         # No ticks on axes.
-        plt.xticks([])
-        plt.yticks([])
-
-        # Set title.
-        plt.title("Green: Randomly moving robot (line for heading).\nRed:     Average position over all {} particles.\nBlue:    {} landmarks.\nCurrent time step: {}.".\
-            format(len(particles), len(world.landmarks), i), horizontalalignment='left')
+        ax.set_xticks([])
+        ax.set_yticks([])
 
-        plt.text(20, 20.3, "A cyclic {}*{} (m) world.".\
+        ax.text(20, 20.3, "A cyclic {}*{} (m) world.".\
             format(world.x_max, world.y_max), fontsize=10, horizontalalignment="right")
+
+        ax.text(10, -0.6, "All the particles are initialized with uniform weight and random state (without prior robot knowledge).", horizontalalignment="center")
 ## -----------------------------------------------------------------------------------------
         """Add landmarks."""
-        landmarks = np.array(world.landmarks)
-        plt.plot(landmarks[:, 0], landmarks[:, 1], 'bs', markersize=self.landmark_size)
+        ax.plot(world.landmarks_array[:, 0], world.landmarks_array[:, 1], 'bs', markersize=self.landmark_size)
+## -----------------------------------------------------------------------------------------
+        """Create the animated artists."""
+        # Animated artists are skipped by a full redraw of the canvas and only drawn when blitting.
+        self._title = ax.set_title("", horizontalalignment='left', animated=True)
+        self._particles = ax.scatter([], [], s=1, animated=True)
+        self._average, = ax.plot([], [], '.', markersize=14, animated=True)
+        # The robot stays hidden until its first pose is known (see 'add_pose').
+        self._robot_circle = plt.Circle((0, 0), self.circle_radius_robot, alpha=0.5, zorder=100, animated=True,
+                                        visible=False)
+        ax.add_patch(self._robot_circle)
+        self._robot_heading, = ax.plot([], [], linewidth=1, linestyle='-', animated=True, visible=False)
+        self._deviation_text = ax.text(0, 20.3, "", fontsize=10, horizontalalignment="left", animated=True)
+        self._animated = [self._title, self._particles, self._average, self._robot_circle, self._robot_heading,
+                          self._deviation_text]
+
+        # Store the static background after every full redraw (e.g. after resizing the window).
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        """
+        Store the freshly drawn static background and draw the animated artists on top of it.
+        """
+
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self._animated:
+            self.fig.draw_artist(artist)
+
+    def draw_world(self, world, robot, *, particles_xy=None, average_state=None, number_of_particles=None, i=None,
+                   hold_on=False, particle_color='r'):
+        """
+        Draw a world with landmarks, a robot with its pose (position x, y and orientation heading angle) and
+        particles with their poses to represent the discrete probability distribution for estimation.
+        Only the artists which change from frame to frame are redrawn,
+        and only the given ones of 'particles_xy' and 'average_state' are drawn.
+
+        :param world:               World object with its dimensions and landmarks.
+        :param robot:               Robot object with its true (perturbed) pose (position x, y and orientation heading angle).
+        :param particles_xy:        Particle positions as a pair of arrays (x-positions, y-positions).
+        :param average_state:       The averaged position among all the weighted particles.
+        :param number_of_particles: Number of particles shown in the title (defaults to the length of 'particles_xy').
+        :param i:                   The current time step.
+        :param hold_on:             Boolean indicating whether the previous frame must be kept or not.
+        :param particle_color:      Color used for particles
+        """
+
+        if self.fig is None or world is not self._world or not plt.fignum_exists(self.fig.number):
+            self._setup(world)
+        if self._background is None:
+            self.fig.canvas.draw()
+
+        if number_of_particles is None and particles_xy is not None:
+            number_of_particles = len(particles_xy[0])
+
+        # Set title.
+        self._title.set_text("Green: Randomly moving robot (line for heading).\nRed:     Average position over all {} particles.\nBlue:    {} landmarks.\nCurrent time step: {}.".\
+            format(number_of_particles, len(world.landmarks), i))
 ## -----------------------------------------------------------------------------------------
         """Add particles."""
-        if average_state != None:
-            plt.plot(average_state[0], average_state[1], particle_color+'.', markersize=14)
+        if particles_xy is not None:
+            self._particles.set_offsets(np.column_stack(particles_xy))
+            self._particles.set_color(particle_color)
+        else:
+            self._particles.set_offsets(np.empty((0, 2)))
+
+        if average_state is not None:
+            self._average.set_data([average_state[0]], [average_state[1]])
+            self._average.set_color(particle_color)
         else:
-            states = np.array([np.array(particle[1]) for particle in particles])
-            plt.plot(states[:, 0], states[:, 1], particle_color+'.', markersize=1)
+            self._average.set_data([], [])
 ## -----------------------------------------------------------------------------------------
         """Add robot."""
         self.add_pose(robot.x, robot.y, robot.theta, 'g', self.circle_radius_robot)
 ## -----------------------------------------------------------------------------------------
-        print("Deviation distance between actual and estimated robot positions is {} .".\
-            format(np.sqrt((robot.x-average_state[0])**2+(robot.y-average_state[1])**2)))
-        print("Deviation in x is {} .".format(robot.x-average_state[0]))
-        print("Deviation in y is {} .".format(robot.y-average_state[1]))
-        print()
-        plt.text(0, 20.3, "Distance deviation is {} (m).".\
-            format(round(np.sqrt((robot.x-average_state[0])**2+(robot.y-average_state[1])**2), 2)), fontsize=10, horizontalalignment="left")
+        # The deviation needs an estimate to compare the robot with.
+        if average_state is not None:
+            deviation = math.hypot(robot.x-average_state[0], robot.y-average_state[1])
+            if self.verbose and (i is None or i % self.text_every == 0):
+                print("Deviation distance between actual and estimated robot positions is {} .".format(deviation))
+                print("Deviation in x is {} .".format(robot.x-average_state[0]))
+                print("Deviation in y is {} .".format(robot.y-average_state[1]))
+                print()
+            deviation_text = "Distance deviation is {} (m).".format(round(deviation, 2))
+        else:
+            deviation_text = ""
 
-        plt.text(10, -0.6, "All the particles are initialized with uniform weight and random state (without prior robot knowledge).", horizontalalignment="center")
+        # Only touch the text artist when its content changes.
+        if self._deviation_text.get_text() != deviation_text:
+            self._deviation_text.set_text(deviation_text)
+## -----------------------------------------------------------------------------------------
+        """Blit the changed artists."""
+        if not hold_on:
+            self.fig.canvas.restore_region(self._background)
+        for artist in self._animated:
+            self.fig.draw_artist(artist)
+        self.fig.canvas.blit(self.fig.bbox)
+        self.fig.canvas.flush_events()
 
     def add_pose(self, x, y, theta, color, radius):
         """
-        Plot a robot pose (position x, y and orientation heading angle) in the figure
+        Move the robot pose (position x, y and orientation heading angle) in the figure
         with given color and radius (circle with line indicating heading).
 
         :param x:      X-position (circle center).
@@ -99,12 +192,19 @@ class Visualizer:
         :param radius: Radius of the circle.
         """
 
-        # Define a circle as the robot at the given position.
-        circle = plt.Circle((x, y), radius, facecolor=color, edgecolor=color, alpha=0.5, zorder=100)
-        plt.gca().add_patch(circle) # Apply the rendering function to display the circle.
+        # Move the circle representing the robot to the given position.
+        self._robot_circle.center = (x, y)
+        self._robot_circle.set_radius(radius)
+        self._robot_circle.set_facecolor(color)
+        self._robot_circle.set_edgecolor(color)
+        self._robot_circle.set_visible(True)
 
-        # Draw line indicating heading angle.
-        plt.plot([x, x + radius * np.cos(theta)], [y, y + radius * np.sin(theta)], color=color, linewidth=1, linestyle='-')
+        # Update line indicating heading angle.
+        c = math.cos(theta)
+        s = math.sin(theta)
+        self._robot_heading.set_data([x, x + radius * c], [y, y + radius * s])
+        self._robot_heading.set_color(color)
+        self._robot_heading.set_visible(True)
 
     def display_world(self, world):
         """
@@ -114,35 +214,5 @@ class Visualizer:
         :param world:          World object with its dimensions and landmarks.
         """
 
-        """Begin drawing."""
-        x_min = -self.x_margin
-        x_max = self.x_margin + world.x_max
-        y_min = -self.y_margin
-        y_max = self.y_margin + world.y_max
-
-        plt.figure(num=1, figsize=((x_max-x_min) / self.scale, (y_max-y_min) / self.scale), frameon=False)
-
-        ax=plt.gca()  #plt.gca(): get current axis.
-        ax.spines['right'].set_color('none')
-        ax.spines['left'].set_color('none')
-## -----------------------------------------------------------------------------------------
-        """Draw a world."""
-        plt.plot([0, world.x_max], [0, 0], color='k', linewidth=1, linestyle='-')                      # lower line: (0, 0) → (world.x_max, 0).
-        plt.plot([0, 0], [0, world.y_max], color='k', linewidth=1, linestyle='-')                      # left line:  (0, 0) → (0, world.y_max).
-        plt.plot([0, world.x_max], [world.y_max, world.y_max], color='k', linewidth=1, linestyle='-')  # top line:   (0, world.y_max) → (world.x_max, world.y_max).
-        plt.plot([world.x_max, world.x_max], [0, world.y_max], color='k', linewidth=1, linestyle='-')  # right line: (world.x_max, 0) → (world.x_max, world.y_max).
-
-        # Set axes limits.
-        plt.xlim([x_min, x_max])
-        plt.ylim([y_min, y_max])
-
-        # No ticks on axes.
-        plt.xticks([])
-        plt.yticks([])
-
-        plt.text(20, 20.3, "A cyclic {}*{} (m) world.".\
-            format(world.x_max, world.y_max), fontsize=10, horizontalalignment="right")
-## -----------------------------------------------------------------------------------------
-        """Add landmarks."""
-        landmarks = np.array(world.landmarks)
-        plt.plot(landmarks[:, 0], landmarks[:, 1], 'bs', markersize=self.landmark_size)
+        self._setup(world)
+        self.fig.canvas.draw()
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class World:
 
     def __init__(self, size_x, size_y, landmarks):        
@@ -6,7 +9,8 @@ class World:
 
         :param size_x: Length world in x-direction (m).
         :param size_y: Length world in y-direction (m).
-        :param landmarks: A list of 2D-positions of landmarks in lists.
+        :param landmarks: A list of 2D-positions of landmarks in lists
+                          (also cached as an array of shape (number of landmarks, 2) in 'landmarks_array').
         """
 
         # Initialize robot pose.
@@ -15,16 +19,15 @@ class World:
 
         print("Initialize world with landmarks {}.".format(landmarks))
 
-        # Check if there is an non-list-element within landmarks list.
-        if any(not isinstance(lm, list) for lm in landmarks):
-            # Not a list of lists, then exactly two elements allowed (x,y)-position single landmark
-            if len(landmarks) != 2:
-                print("Invalid landmarks provided to World: {}".format(landmarks))
-            else:
-                self.landmarks = [landmarks]
-        else:
-            # Check if there is a list that contains not two elements.
-            if any(len(lm) != 2 for lm in landmarks):
-                print("Invalid landmarks provided to World: {}".format(landmarks))
-            else:
-                self.landmarks = landmarks
+        # Validate all landmarks at once: either a single (x,y)-position or a list of them.
+        try:
+            landmarks_array = np.asarray(landmarks, dtype=np.float64)
+        except ValueError:
+            raise ValueError("Invalid landmarks provided to World: {}".format(landmarks))
+        if landmarks_array.shape == (2,):
+            landmarks_array = landmarks_array.reshape(1, 2)
+        if landmarks_array.ndim != 2 or landmarks_array.shape[1] != 2:
+            raise ValueError("Invalid landmarks provided to World: {}".format(landmarks))
+
+        self.landmarks_array = landmarks_array
+        self.landmarks = landmarks_array.tolist()